@@ -1,26 +1,34 @@
 import warnings as _warnings
 import re as _re
+import os as _os
+import json as _json
+import hashlib as _hashlib
+import shutil as _shutil
 import subprocess as _sp
+import atexit as _atexit
+import threading as _threading
+import time as _time
+import platform as _platform
+from pathlib import Path as _Path
+from fractions import Fraction as _Fraction
+from functools import lru_cache as _lru_cache
 
 from . import logger as _logger
+from . import nvml as _nvml
 
 _LOGGER = _logger()
 
+@_lru_cache(maxsize=None)
 def find_command(cmd):
-    proc = _sp.run(["where", cmd], shell=True,
-                   capture_output=True)
-    if proc.returncode != 0:
-        _warnings.warn(f"failed to find the '{cmd}' command: 'where' returned code {proc.returncode}")
-        return None
-
-    commands = [item.strip() for item in proc.stdout.decode().split("\n")]
-    if len(commands) == 0:
+    """returns the full path to `cmd` by scanning PATH, or None if not found."""
+    path = _shutil.which(cmd)
+    if path is None:
         _warnings.warn(f"the '{cmd}' command not found")
-        return None
-    return commands[0]
+    return path
 
 
 FFMPEG_PATH  = find_command('ffmpeg')
+PROBE_TIMEOUT = 10.0 # the upper bound (in seconds) for an ffmpeg process to query or test the encoders
 BASE_OPTIONS = [
     "-hide_banner", "-loglevel", "warning", "-stats", # render the command to be (more) quiet
     "-y", # overwrite by default
@@ -34,49 +42,278 @@ def ffmpeg_command(with_base_options=True):
     else:
         return [FFMPEG_PATH,]
 
+def ffmpeg_rate(framerate):
+    """returns `framerate` as an exact ffmpeg rational (e.g. '30000/1001' for 30000/1001 = 29.97002997...)."""
+    if isinstance(framerate, int):
+        return str(framerate)
+    rate = _Fraction(framerate).limit_denominator(1001000)
+    if rate.denominator == 1:
+        return str(rate.numerator)
+    return f"{rate.numerator}/{rate.denominator}"
+
 def ffmpeg_input_options(width, height, framerate, pixel_format="rgb24"):
     return [
         "-f", "rawvideo",
         "-vcodec", "rawvideo",
         "-s", f"{width}x{height}",
         "-pix_fmt", pixel_format,
-        "-r", str(framerate),
+        "-r", ffmpeg_rate(framerate),
         "-i", "-",
         "-an", # do not expect any audio
     ]
 
-def test_decoder(codec):
+REPORT_LEVEL = 32 # the log level of the ffmpeg report ('info')
+
+def ffmpeg_report_environment(logpath, level=REPORT_LEVEL):
+    """returns a copy of the environment variables that makes ffmpeg
+    write its full report to `logpath` (through FFREPORT)."""
+    # ':' and '\\' must be escaped in the value of FFREPORT
+    escaped = _os.fspath(logpath).replace("\\", "\\\\").replace(":", "\\:")
+    env = dict(_os.environ)
+    env["FFREPORT"] = f"file={escaped}:level={level}"
+    return env
+
+@_lru_cache(maxsize=16)
+def ffmpeg_input_command(width, height, framerate, pixel_format="rgb24"):
+    """returns the ffmpeg command up to its input options, as a tuple.
+    the result is cached, as it stays the same across recordings with the same settings."""
+    return tuple(ffmpeg_command(with_base_options=True) \
+                 + ffmpeg_input_options(width, height, framerate, pixel_format))
+
+class NVMLStatus:
+    UNKNOWN     = "unknown"     # initialization not attempted yet
+    READY       = "ready"       # NVML has been initialized
+    MISSING     = "missing"     # the NVML library is not installed
+    NO_DRIVER   = "no-driver"   # NVML is installed, but the driver is not functional
+
+_NVML_STATUS = NVMLStatus.UNKNOWN
+_NVML        = None # the nvml.Library object, once initialized
+_NVML_LOCK   = _threading.Lock()
+
+NVIDIA_PCI_VENDOR_ID = "0x10de"
+
+@_lru_cache(maxsize=None)
+def _has_nvidia_device():
+    """checks whether any NVIDIA device is present on the PCI bus.
+    this can be checked only through sysfs (i.e. on Linux); otherwise it returns True.
+    note that a GPU may work without appearing on the bus (e.g. on WSL2)."""
+    devices = _Path("/sys/bus/pci/devices")
+    if not devices.is_dir():
+        return True
+    for vendor in devices.glob("*/vendor"):
+        try:
+            if vendor.read_text().strip().lower() == NVIDIA_PCI_VENDOR_ID:
+                return True
+        except OSError:
+            continue
+    return False
+
+def _init_nvml():
+    """initializes NVML once per process, and returns the resulting NVMLStatus.
+
+    the shutdown is deferred until the exit of the process: while NVML is
+    kept initialized, the driver stays loaded, and the subsequent NVENC
+    tests do not have to pay for the driver initialization every time."""
+    with _NVML_LOCK:
+        if _NVML_STATUS == NVMLStatus.UNKNOWN:
+            _init_nvml_locked()
+        return _NVML_STATUS
+
+def _init_nvml_locked():
+    global _NVML_STATUS, _NVML
+    lib = _nvml.Library.load()
+    if lib is None:
+        if not _has_nvidia_device():
+            # neither the device nor NVML: no NVENC can be expected
+            _LOGGER.debug("neither an NVIDIA device on the PCI bus nor the NVML library was found")
+            _NVML_STATUS = NVMLStatus.NO_DRIVER
+        else:
+            _LOGGER.debug("the NVML library was not found")
+            _NVML_STATUS = NVMLStatus.MISSING
+        return
+    try:
+        lib.init()
+        _atexit.register(_shutdown_nvml, lib)
+        _NVML        = lib
+        _NVML_STATUS = NVMLStatus.READY
+    except _nvml.NVMLError as e:
+        _LOGGER.debug(f"failed to initialize NVML: {e}")
+        _NVML_STATUS = NVMLStatus.NO_DRIVER
+
+def _shutdown_nvml(lib):
+    try:
+        lib.shutdown()
+    except _nvml.NVMLError as e:
+        _LOGGER.debug(f"failed to shut down NVML: {e}")
+
+def nvidia_driver_version():
+    """returns the version string of the NVIDIA driver,
+    or None if it cannot be retrieved through NVML."""
+    if _init_nvml() != NVMLStatus.READY:
+        return None
+    try:
+        return _NVML.driver_version()
+    except _nvml.NVMLError as e:
+        _LOGGER.debug(f"failed to retrieve the NVIDIA driver version: {e}")
+        return None
+
+def number_of_nvidia_gpus():
+    """returns the number of NVIDIA GPUs found through NVML.
+
+    returns None if it cannot be determined because NVML is not installed,
+    so that the caller can fall back to other ways of testing.
+    """
+    status = _init_nvml()
+    if status == NVMLStatus.MISSING:
+        return None
+    elif status == NVMLStatus.NO_DRIVER:
+        return 0
+    try:
+        return _NVML.device_count()
+    except _nvml.NVMLError as e:
+        _LOGGER.debug(f"failed to count NVIDIA GPUs: {e}")
+        return 0
+
+@_lru_cache(maxsize=None)
+def ffmpeg_encoders():
+    """returns the set of the names of the encoders compiled into the current ffmpeg.
+    the list is queried only once per process."""
+    if FFMPEG_PATH is None:
+        return frozenset()
+    try:
+        proc = _sp.run([FFMPEG_PATH, "-hide_banner", "-encoders"],
+                       capture_output=True, timeout=PROBE_TIMEOUT)
+    except (OSError, _sp.TimeoutExpired) as e:
+        _LOGGER.debug(f"failed to list the encoders: {e}")
+        return frozenset()
+    if proc.returncode != 0:
+        _LOGGER.debug(f"failed to list the encoders: ffmpeg returned code {proc.returncode}")
+        return frozenset()
+    # each entry after the '------' line reads e.g. ' V....D mjpeg   MJPEG (Motion JPEG)'
+    listing = proc.stdout.partition(b"------")[2]
+    names   = set()
+    for line in listing.splitlines():
+        fields = line.split(maxsplit=2)
+        if len(fields) > 1:
+            names.add(fields[1].decode())
+    return frozenset(names)
+
+def has_encoder(codec):
+    """returns whether `codec` is compiled into the current ffmpeg.
+
+    note that it does not tell whether the hardware required by
+    the encoder is present: use test_decoder() for this purpose."""
+    return codec in ffmpeg_encoders()
+
+def test_decoder(codec, options=()):
+    """test-encodes a short, generated sequence with `codec` (and the encoder `options`),
+    and returns whether it succeeded (or None in case the test timed out).
+    the encoded frames are discarded, so that nothing is written to the disk."""
     if FFMPEG_PATH is None:
         return False # no meaning in asking the question
-    from pathlib import Path
-    testdir = Path(__file__).resolve().parent
-    filepat = testdir / "enctest" / "%03d.jpg"
-    outfile = testdir / "enctest.avi"
-    if outfile.exists():
-        outfile.unlink() # just in case
     try:
-        proc    = _sp.run([FFMPEG_PATH,] + BASE_OPTIONS + \
-                          ["-f", "image2",
-                           "-framerate", "1",
-                           "-i", str(filepat),
-                           "-r", "1",
-                           "-c:v", str(codec),
-                           str(outfile)], capture_output=True)
-        if outfile.exists():
-            status = "output file is generated"
-        else:
-            status = "output file does not exist"
-        _LOGGER.info(f"testing encoder '{codec}': ffmpeg returned code {proc.returncode}; {status}")
+        proc = _sp.run([FFMPEG_PATH,] + BASE_OPTIONS + \
+                       ["-f", "lavfi",
+                        "-i", "testsrc=size=320x240:rate=10",
+                        "-frames:v", "10",
+                        "-c:v", str(codec),] + list(options) + \
+                       ["-f", "null", "-"], capture_output=True, timeout=PROBE_TIMEOUT)
+        _LOGGER.info(f"testing encoder '{codec}': ffmpeg returned code {proc.returncode}")
         if proc.returncode != 0:
             for line in proc.stderr.decode().split("\n"):
                 line = line.strip()
                 if len(line) > 0:
                     _LOGGER.debug(line)
-        return (proc.returncode == 0) and outfile.exists()
+        return (proc.returncode == 0)
+    except _sp.TimeoutExpired:
+        _LOGGER.warning(f"testing encoder '{codec}': ffmpeg did not finish within {PROBE_TIMEOUT} seconds")
+        return None # inconclusive
     except:
         from traceback import print_exc
         print_exc()
         return False
-    finally:
-        if outfile.exists():
-            outfile.unlink()
+
+AVAILABILITY_CACHE_NAME     = "encoder-availability.json"
+AVAILABILITY_CACHE_LIFETIME = 7 * 24 * 3600 # seconds; covers the driver updates the key cannot tell
+_AVAILABILITY_CACHE_LOCK = _threading.Lock()
+
+def cache_directory():
+    """returns the per-user directory where lab-grab caches its state."""
+    if (_os.name == "nt") and ("LOCALAPPDATA" in _os.environ):
+        base = _Path(_os.environ["LOCALAPPDATA"])
+    elif "XDG_CACHE_HOME" in _os.environ:
+        base = _Path(_os.environ["XDG_CACHE_HOME"])
+    else:
+        base = _Path.home() / ".cache"
+    return base / "lab-grab"
+
+@_lru_cache(maxsize=None)
+def _hardware_identity():
+    """returns a string identifying the host, its OS release and its display adapters
+    (the latter only where they can be listed through sysfs, i.e. on Linux)."""
+    ident   = [_platform.node(), _platform.platform()]
+    devices = _Path("/sys/bus/pci/devices")
+    if devices.is_dir():
+        for device in sorted(devices.iterdir()):
+            try:
+                if (device / "class").read_text().strip().startswith("0x03"): # display controller
+                    ident.append((device / "vendor").read_text().strip() + ":" \
+                                 + (device / "device").read_text().strip())
+            except OSError:
+                continue
+    return "/".join(ident)
+
+def _availability_key(codec, options=()):
+    """the key identifying the environment in which `codec` (with `options`) has been tested."""
+    try:
+        mtime = _os.path.getmtime(FFMPEG_PATH)
+    except OSError:
+        mtime = None
+    ident = f"{FFMPEG_PATH}:{codec}:{' '.join(options)}:{mtime}:{nvidia_driver_version()}:{_hardware_identity()}"
+    return _hashlib.blake2b(ident.encode(), digest_size=16).hexdigest()
+
+def _load_availability_cache():
+    path = cache_directory() / AVAILABILITY_CACHE_NAME
+    try:
+        with open(path, "r") as src:
+            return _json.load(src)
+    except (OSError, ValueError):
+        return {}
+
+def _save_availability_cache(cache):
+    path = cache_directory() / AVAILABILITY_CACHE_NAME
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as out:
+            _json.dump(cache, out, indent=4)
+    except OSError as e:
+        _LOGGER.debug(f"failed to save the encoder availability to: {path} ({e})")
+
+@_lru_cache(maxsize=None)
+def check_encoder(codec, options=()):
+    """returns whether the encoder `codec` works with the current ffmpeg,
+    when used with the encoder `options` (a tuple).
+
+    a successful test_decoder() is stored on disk, and is reused until the ffmpeg executable,
+    the NVIDIA driver or the hardware changes, but no longer than AVAILABILITY_CACHE_LIFETIME
+    (e.g. an Intel driver update cannot be detected). failures are not stored,
+    as they may be temporary (e.g. the hardware being busy with another application).
+    """
+    if FFMPEG_PATH is None:
+        return False
+    key   = _availability_key(codec, options)
+    entry = _load_availability_cache().get(codec, {})
+    tested = entry.get("tested", 0)
+    if (entry.get("key") == key) and (entry.get("available") == True) \
+            and (0 <= _time.time() - tested < AVAILABILITY_CACHE_LIFETIME):
+        _LOGGER.debug(f"encoder '{codec}': using the cached test result")
+        return True
+    available = test_decoder(codec, options)
+    if not available:
+        return False # do not store the negative (or inconclusive) result
+    with _AVAILABILITY_CACHE_LOCK:
+        # re-load, so that results stored by concurrent tests are kept
+        cache        = _load_availability_cache()
+        cache[codec] = dict(key=key, available=available, tested=_time.time())
+        _save_availability_cache(cache)
+    return available
@@ -20,11 +20,10 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+import os as _os
 import subprocess as _sp
 from collections import namedtuple as _namedtuple
-from collections import deque as _deque
-
-from pyqtgraph.Qt import QtCore as _QtCore
+from concurrent.futures import ThreadPoolExecutor as _ThreadPoolExecutor
 
 from . import logger as _logger
 from . import backends as _backends
@@ -37,7 +36,10 @@ class Devices:
     QSV    = "Intel-QSV CPU"
     NVIDIA = "NVIDIA GPU"
 
-class Encoder(_namedtuple("_Encoder", ("name", "device", "suffix", "vcodec", "pix_fmt", "quality_option"))):
+class Encoder(_namedtuple("_Encoder", ("name", "device", "suffix", "vcodec", "pix_fmt", "quality_option", "encoder_options"),
+                          defaults=((),))):
+    __slots__ = ()
+
     @property
     def description(self):
         return f"{self.label} (*{self.suffix})"
@@ -50,35 +52,78 @@ class Encoder(_namedtuple("_Encoder", ("name", "device", "suffix", "vcodec", "pi
         return ret
 
     def check_availability(self):
-        return _backends.test_decoder(self.vcodec)
+        if not _backends.has_encoder(self.vcodec):
+            _LOGGER.info(f"encoder '{self.vcodec}' is not supported by ffmpeg")
+            return False
+        elif self.device in (Devices.NONE, Devices.CPU):
+            return True # software encoders need no hardware to be tested
+        elif (self.device == Devices.NVIDIA) and (_backends.number_of_nvidia_gpus() == 0):
+            _LOGGER.info(f"no NVIDIA GPU found: skip testing encoder '{self.vcodec}'")
+            return False
+        else:
+            return _backends.check_encoder(self.vcodec, self.encoder_options)
+
+    def available_variant(self):
+        """returns this encoder if it is available, or otherwise its variant without
+        `encoder_options` in case only the latter works (e.g. with an older ffmpeg
+        that does not know the options). returns None if neither is available."""
+        if self.check_availability():
+            return self
+        elif len(self.encoder_options) > 0:
+            plain = self._replace(encoder_options=())
+            if plain.check_availability():
+                _LOGGER.info(f"encoder '{self.vcodec}' works only without: {' '.join(self.encoder_options)}")
+                return plain
+        return None
 
     def has_quality_setting(self):
-        # return len(self.quality_option(1)) > 0
-        return sum(1 for _ in self.quality_option(1)) > 0
+        return bool(self.quality_option(1))
 
     def as_ffmpeg_command(self, outpath, descriptor, rotation, framerate=30, quality=75):
         """returns a list of options used to encode using the ffmpeg command."""
 
         ## FIXME: how shall we set e.g. the CRF value / bit rate?
         shape = rotation.transform_shape(descriptor.shape)
-        return _backends.ffmpeg_command(with_base_options=True) \
-                + _backends.ffmpeg_input_options(
+        cmd   = list(_backends.ffmpeg_input_command(
                     width=shape[1],
                     height=shape[0],
                     framerate=framerate,
                     pixel_format=descriptor.color_format.ffmpeg_style
-                ) \
-                + [ "-vcodec", self.vcodec ] + self.quality_option(quality) \
-                + [
-                    "-pix_fmt", self.pix_fmt,
-                    str(outpath)
-                ]
+                ))
+        cmd.extend(("-vcodec", self.vcodec))
+        cmd.extend(self.encoder_options)
+        cmd.extend(self.quality_option(quality))
+        cmd.extend(("-pix_fmt", self.pix_fmt, _os.fspath(outpath)))
+        return cmd
 
     def open_ffmpeg(self, outpath, descriptor, rotation, framerate=30, quality=75):
         """opens and returns a `subprocess.Popen` object
-        corresponding to the encoder process."""
+        corresponding to the encoder process.
+
+        the STDIN of the process is unbuffered, as it is always written frame by frame.
+        the STDERR of the process is piped, and must be drained by the caller.
+        in the debug mode, ffmpeg also writes its full report next to `outpath`."""
+        from . import DEBUG
+        env = None
+        if DEBUG == True:
+            logpath = _os.fspath(outpath) + ".ffreport.log"
+            _LOGGER.debug(f"ffmpeg report: {logpath}")
+            env = _backends.ffmpeg_report_environment(logpath)
         return _sp.Popen(self.as_ffmpeg_command(outpath, descriptor, rotation, framerate, quality),
-                            stdin=_sp.PIPE)
+                            stdin=_sp.PIPE, stdout=_sp.DEVNULL, stderr=_sp.PIPE, bufsize=0, env=env)
+
+def _quality_norms(worst, best):
+    """returns the table of encoder-specific quality norms, indexed by the quality value (0 to 100)."""
+    return tuple(str(worst + round((1 - value) * (worst - best) / 99)) for value in range(101))
+
+def _lookup_norm(table, value):
+    return table[min(max(int(value), 0), 100)]
+
+# the fastest preset, tuned so that frames are not held back by the encoder
+NVENC_LOW_LATENCY_OPTIONS = ("-preset", "p1", "-tune", "ll", "-zerolatency", "1")
+
+_MJPEG_NORMS = _quality_norms(31, 2)
+_H264_NORMS  = _quality_norms(43, 10)
 
 def no_quality_option(value):
     _LOGGER.debug("no quality norm defined")
@@ -86,21 +131,47 @@ def no_quality_option(value):
 
 def mjpeg_quality_option(value):
     """returns the value from 2 to 31, with a lower value being a higher quality."""
-    quality = 31 + round((1 - value) * 29 / 99)
+    quality = _lookup_norm(_MJPEG_NORMS, value)
     _LOGGER.debug(f"MJPEG quality norm: {quality}")
-    return [ "-q:v", str(quality) ]
+    return [ "-q:v", quality ]
 
 def h264_nvenc_quality_option(value):
     """try to convert quality from 10 to 43, with a lower value being a higher quality."""
-    quality = 43 + round((1 - value) * 33 / 99)
+    quality = _lookup_norm(_H264_NORMS, value)
     _LOGGER.debug(f"NVEnc quality norm: {quality}")
-    return [ "-rc:v", "vbr", "-cq:v", str(quality) ]
+    return [ "-rc:v", "vbr", "-cq:v", quality ]
+
+def h264_qsv_quality_option(value):
+    """try to convert quality from 10 to 43, with a lower value being a higher quality."""
+    quality = _lookup_norm(_H264_NORMS, value)
+    _LOGGER.debug(f"QSV quality norm: {quality}")
+    return [ "-global_quality", quality ]
 
 
 RAW_VIDEO  = Encoder("Raw video", Devices.NONE,   ".avi", "rawvideo",   "yuv420p",  no_quality_option)
 MJPEG_CPU  = Encoder("MJPEG",     Devices.CPU,    ".avi", "mjpeg",      "yuvj420p", mjpeg_quality_option)
 MJPEG_QSV  = Encoder("MJPEG",     Devices.QSV,    ".avi", "mjpeg_qsv",  "yuvj420p", mjpeg_quality_option)
-H264_NVENC = Encoder("H.264",     Devices.NVIDIA, ".avi", "h264_nvenc", "yuv420p",  h264_nvenc_quality_option)
+H264_QSV   = Encoder("H.264",     Devices.QSV,    ".avi", "h264_qsv",   "nv12",     h264_qsv_quality_option)
+H264_NVENC = Encoder("H.264",     Devices.NVIDIA, ".avi", "h264_nvenc", "yuv420p",  h264_nvenc_quality_option,
+                     NVENC_LOW_LATENCY_OPTIONS)
+
+BASE_ENCODER_LIST = (
+    RAW_VIDEO,
+    MJPEG_CPU,
+    MJPEG_QSV,
+    H264_QSV,
+    H264_NVENC,
+)
+
+def available_encoders(encoders):
+    """returns the tuple of the available variants of `encoders` (see Encoder.available_variant()),
+    in the original order. the availability of the encoders is tested concurrently."""
+    encoders = tuple(encoders)
+    if len(encoders) == 0:
+        return ()
+    with _ThreadPoolExecutor(max_workers=len(encoders)) as pool:
+        variants = tuple(pool.map(Encoder.available_variant, encoders))
+    return tuple(enc for enc in variants if enc is not None)
 
 class Options(_namedtuple("_options", ("encoder",
                                        "path",
@@ -108,6 +179,8 @@ class Options(_namedtuple("_options", ("encoder",
                                        "rotation",
                                        "framerate",
                                        "quality"))):
+    __slots__ = ()
+
     def __new__(cls,
                 encoder=None,
                 path=None,
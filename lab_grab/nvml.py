@@ -0,0 +1,84 @@
+# MIT License
+#
+# Copyright (c) 2021 Keisuke Sehara
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# a minimal binding to the NVIDIA Management Library (NVML) through ctypes
+
+import os as _os
+import ctypes as _ctypes
+
+NVML_SUCCESS               = 0
+DRIVER_VERSION_BUFFER_SIZE = 80 # NVML_SYSTEM_DRIVER_VERSION_BUFFER_SIZE
+
+class NVMLError(RuntimeError):
+    def __init__(self, code, message):
+        super().__init__(f"{message} (NVML error code {code})")
+        self.code = code
+
+def library_names():
+    """returns the candidate file names of the NVML library on this platform."""
+    if _os.name == "nt":
+        return (
+            "nvml.dll", # installed in System32 by the recent drivers
+            _os.path.join(_os.environ.get("ProgramFiles", r"C:\Program Files"),
+                          "NVIDIA Corporation", "NVSMI", "nvml.dll"),
+        )
+    else:
+        return ("libnvidia-ml.so.1", "libnvidia-ml.so")
+
+class Library:
+    """a thin wrapper around the NVML shared library.
+    use Library.load() to obtain an instance."""
+
+    @classmethod
+    def load(cls):
+        """returns a Library object, or None if the NVML library cannot be found."""
+        for name in library_names():
+            try:
+                return cls(_ctypes.CDLL(name))
+            except OSError:
+                continue
+        return None
+
+    def __init__(self, lib):
+        self._lib = lib
+        self._lib.nvmlErrorString.restype = _ctypes.c_char_p
+
+    def _check(self, code):
+        if code != NVML_SUCCESS:
+            raise NVMLError(code, self._lib.nvmlErrorString(code).decode())
+
+    def init(self):
+        self._check(self._lib.nvmlInit_v2())
+
+    def shutdown(self):
+        self._check(self._lib.nvmlShutdown())
+
+    def driver_version(self):
+        """returns the version string of the driver, e.g. '470.82.01'."""
+        buf = _ctypes.create_string_buffer(DRIVER_VERSION_BUFFER_SIZE)
+        self._check(self._lib.nvmlSystemGetDriverVersion(buf, _ctypes.c_uint(DRIVER_VERSION_BUFFER_SIZE)))
+        return buf.value.decode()
+
+    def device_count(self):
+        count = _ctypes.c_uint(0)
+        self._check(self._lib.nvmlDeviceGetCount_v2(_ctypes.byref(count)))
+        return count.value
@@ -218,6 +218,7 @@ class ExposureSetting(_models.ValueModel):
     DEFAULT_RANGE        = (50, 10_000_000)
     DEFAULT_AUTO         = False
     DEFAULT_VALUE        = 33000 # 33 ms, for 30 Hz acquisition
+    CACHE_RANGE          = False # the range depends on the current frame rate
 
     def __init__(self, device=None, preferred=None, parent=None):
         super().__init__(name="exposure", device=device, preferred=preferred, parent=parent)
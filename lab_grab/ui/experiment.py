@@ -21,6 +21,7 @@
 # SOFTWARE.
 
 from datetime import datetime as _datetime
+from contextlib import contextmanager as _contextmanager
 from pyqtgraph.Qt import QtCore as _QtCore
 
 class Experiment(_QtCore.QObject):
@@ -53,10 +54,37 @@ class Experiment(_QtCore.QObject):
         super().__init__(parent=parent)
         self._subject = self.DEFAULT_SUBJECT
         self._date    = _datetime.now()
+        self._datestr = self._date.strftime(self.date_format)
         self._index   = 1
+        self._idxstr  = self._format_index(self._index)
         self._domain  = self.DEFAULT_DOMAIN
         self._append  = ""
 
+        self._batching = 0     # the depth of the nested batch_updates() blocks
+        self._pending  = False # whether `updated` is waiting to be emitted
+
+    def _format_index(self, index):
+        return f"{index:0{self.INDEX_DIGITS}d}"
+
+    def _fireUpdated(self):
+        if self._batching > 0:
+            self._pending = True
+        else:
+            self.updated.emit()
+
+    @_contextmanager
+    def batch_updates(self):
+        """defers the `updated` signal until the end of the block,
+        so that it is emitted at most once for multiple changes."""
+        self._batching += 1
+        try:
+            yield self
+        finally:
+            self._batching -= 1
+            if (self._batching == 0) and (self._pending == True):
+                self._pending = False
+                self.updated.emit()
+
     def as_dict(self):
         out = {}
         out["subject"] = self.subject
@@ -67,16 +95,17 @@ class Experiment(_QtCore.QObject):
         return out
 
     def load_dict(self, cfg):
-        if "subject" in cfg.keys():
-            self.subject = cfg["subject"]
-        if "date" in cfg.keys():
-            self.date = _datetime.strptime(cfg["date"], self.date_format)
-        if "index" in cfg.keys():
-            self.index = cfg["index"]
-        if "domain" in cfg.keys():
-            self.domain = cfg["domain"]
-        if "append" in cfg.keys():
-            self.appendage = cfg["append"]
+        with self.batch_updates():
+            if "subject" in cfg.keys():
+                self.subject = cfg["subject"]
+            if "date" in cfg.keys():
+                self.date = _datetime.strptime(cfg["date"], self.date_format)
+            if "index" in cfg.keys():
+                self.index = cfg["index"]
+            if "domain" in cfg.keys():
+                self.domain = cfg["domain"]
+            if "append" in cfg.keys():
+                self.appendage = cfg["append"]
 
     def getSubject(self):
         return self._subject
@@ -84,7 +113,7 @@ class Experiment(_QtCore.QObject):
     def setSubject(self, value):
         self._subject = value
         self.updatedSubject.emit(value)
-        self.updated.emit()
+        self._fireUpdated()
         self.message.emit("info", f"experiment subject: {value}")
 
     def getDate(self):
@@ -92,10 +121,11 @@ class Experiment(_QtCore.QObject):
 
     def setDate(self, value):
         ## FIXME: only accepts datetime for the time being
-        self._date = value
+        self._date    = value
+        self._datestr = value.strftime(self.date_format)
         self.updatedDate.emit(value.year, value.month, value.day)
-        self.updated.emit()
-        self.message.emit("info", f"experiment date: {value.strftime(self.date_format)}")
+        self._fireUpdated()
+        self.message.emit("info", f"experiment date: {self._datestr}")
 
     def getQDate(self):
         return _QtCore.QDate(self._date.year, self._date.month, self._date.day)
@@ -107,13 +137,14 @@ class Experiment(_QtCore.QObject):
         return self._index
 
     def setIndex(self, value):
-        self._index = int(value)
+        self._index  = int(value)
+        self._idxstr = self._format_index(self._index)
         self.updatedIndex.emit(self._index)
-        self.updated.emit()
-        self.message.emit("info", f"session index: {self._index:03d}")
+        self._fireUpdated()
+        self.message.emit("info", f"session index: {self._idxstr}")
 
     def getIndexStr(self):
-        return str(self._index).zfill(3)
+        return self._idxstr
 
     def setIndexStr(self, value):
         self.setIndex(value)
@@ -124,7 +155,7 @@ class Experiment(_QtCore.QObject):
     def setDomain(self, value):
         self._domain = value
         self.updatedDomain.emit(value)
-        self.updated.emit()
+        self._fireUpdated()
         self.message.emit("info", f"experiment data domain: {value}")
 
     def getAppendage(self):
@@ -133,7 +164,7 @@ class Experiment(_QtCore.QObject):
     def setAppendage(self, value):
         self._append = str(value).strip()
         self.updatedAppendage.emit(self._append)
-        self.updated.emit()
+        self._fireUpdated()
         self.message.emit("info", f"file appendage: {self._append}")
 
     @property
@@ -146,11 +177,7 @@ class Experiment(_QtCore.QObject):
 
     @property
     def datestr(self):
-        return self.date.strftime(self.date_format)
-
-    @property
-    def indexstr(self):
-        return str(self.index).zfill(self.INDEX_DIGITS)
+        return self._datestr
 
     @property
     def appendagestr(self):
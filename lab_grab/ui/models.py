@@ -99,7 +99,8 @@ class ValueModel(DeviceSetting):
 
     - isAutoImpl(): bool
     - setAutoImpl(bool)
-    - getRangeImpl(): int/float, int/float
+    - getRangeImpl(): int/float, int/float (cached until the device changes or fireRangeChanged() is called,
+      unless CACHE_RANGE is False)
     - getValueImpl(): int/float
     - setValueImpl(int/float)
     """
@@ -112,10 +113,12 @@ class ValueModel(DeviceSetting):
     DEFAULT_AUTO         = False
     DEFAULT_VALUE        = None
     DEFAULT_RANGE        = None
+    CACHE_RANGE          = True # set False if the range may change without a device change
 
     def __init__(self, name=NAME_UNKNOWN, device=None, preferred=None, parent=None):
         super().__init__(name=name, device=device, parent=parent)
         self._preferred = preferred
+        self._range     = None # the cached return value of getRangeImpl()
 
     def as_dict(self):
         out = {}
@@ -139,6 +142,7 @@ class ValueModel(DeviceSetting):
 
     # override
     def updateWithDeviceImpl(self, device):
+        self._range = None
         if device is not None:
             self.fireRangeChanged()
             self.fireSettingsChanged()
@@ -150,6 +154,7 @@ class ValueModel(DeviceSetting):
 
     def fireRangeChanged(self):
         """fires the rangeChanged event with the current valid range."""
+        self._range = None # re-read from the device
         m, M = self.getRange()
         _LOGGER.debug(f"range of '{self.name}' changed to: ({m}, {M})")
         self.rangeChanged.emit(m, M)
@@ -224,8 +229,13 @@ class ValueModel(DeviceSetting):
         """returns (min, max) for the manual settings."""
         if self._device is None:
             return self.DEFAULT_RANGE
+        elif self._range is not None:
+            return self._range
         try:
-            return self.getRangeImpl()
+            m, M = self.getRangeImpl()
+            if self.CACHE_RANGE == True:
+                self._range = (m, M)
+            return m, M
         except BaseException as e:
             self.fireDriverError(e)
             return self.DEFAULT_RANGE
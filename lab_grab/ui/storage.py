@@ -23,38 +23,254 @@
 from pathlib import Path as _Path
 from datetime import datetime as _datetime
 from traceback import print_exc as _print_exc
+import os as _os
+import re as _re
 import sys as _sys
+import time as _time
+import threading as _threading
+import queue as _queue
 import subprocess as _sp
 
 import numpy as _np
 from pyqtgraph.Qt import QtCore as _QtCore
 
+try:
+    import fcntl as _fcntl
+except ImportError: # on Windows
+    _fcntl = None
+
 from .. import logger as _logger
 from .. import encoding as _encoding
+from .experiment import Experiment as _Experiment
 
 _LOGGER = _logger()
 
+def write_fully(fd, view):
+    """writes the whole content of `view` (a byte-cast memoryview) to the file descriptor `fd`."""
+    while len(view) > 0:
+        view = view[_os.write(fd, view):]
+
+def writev_fully(fd, views):
+    """writes the whole content of `views` (a list of byte-cast memoryviews) to `fd`,
+    using as few system calls as possible. `views` is consumed in the process."""
+    if not hasattr(_os, "writev"): # on Windows
+        for view in views:
+            write_fully(fd, view)
+        return
+    while len(views) > 0:
+        written = _os.writev(fd, views)
+        while written > 0:
+            if written < len(views[0]):
+                views[0] = views[0][written:]
+                break
+            written -= len(views.pop(0))
+
+PIPE_SIZE = 1 << 20 # 1 MiB, the default upper limit for non-privileged processes on Linux
+
+def enlarge_pipe(fd, size=PIPE_SIZE):
+    """tries to enlarge the OS-level buffer of the pipe `fd` up to `size` bytes.
+    this is only possible on Linux, and does nothing on the other platforms."""
+    if (_fcntl is None) or (not _sys.platform.startswith("linux")):
+        return
+    try:
+        _fcntl.fcntl(fd, getattr(_fcntl, "F_SETPIPE_SZ", 1031), size)
+    except OSError as e:
+        _LOGGER.debug(f"failed to enlarge the pipe to the encoder: {e}")
+
+def log_encoder_output(stream, chunksize=4096):
+    """forwards the (STDERR) output of the encoder process to the logger, line by line,
+    until the stream is closed. '\\r', which ffmpeg uses for its progress lines,
+    is also taken as a line break."""
+    pending = b""
+    for chunk in iter(lambda: stream.read(chunksize), b""):
+        lines   = _re.split(b"[\r\n]", pending + chunk)
+        pending = lines.pop()
+        for line in lines:
+            _log_encoder_line(line)
+    _log_encoder_line(pending)
+
+def _log_encoder_line(line):
+    line = line.decode(errors="replace").strip()
+    if len(line) == 0:
+        return
+    elif line.startswith("frame="): # progress
+        _LOGGER.debug(f"encoder: {line}")
+    else:
+        _LOGGER.warning(f"encoder: {line}")
+
+class FrameWriter:
+    """writes frames to the file descriptor `fd` on a background thread.
+
+    each frame is transposed by `axes` into one of the `capacity` pre-allocated buffers,
+    which is then queued for writing. when all the buffers are in use (i.e. when the
+    encoder cannot keep up with the acquisition), the frame is dropped, and an empty
+    frame is written in its place so that the timing of the video is preserved.
+    the empty frames also wait for a free buffer, so that no more than `capacity`
+    frames are ever queued.
+    `on_error(exc)` is called from the background thread if writing fails."""
+
+    MAX_BATCH = 64 # the maximum number of frames written at once (well below IOV_MAX)
+
+    def __init__(self, fd, shape, dtype, axes, capacity=8, on_error=None):
+        self._fd       = fd
+        self._axes     = tuple(axes)
+        self._on_error = on_error
+        self._free     = _queue.SimpleQueue() # the buffers available for the next frames
+        self._filled   = _queue.SimpleQueue() # the buffers waiting to be written
+        self._dropped  = 0
+        self._pending  = 0 # the number of empty frames waiting for a free buffer
+        self._error    = None
+        self._abort    = False # set by close() to stop writing, once its timeout is over
+        for _ in range(capacity):
+            buf = _np.empty(shape, dtype=dtype)
+            self._free.put((buf, memoryview(buf).cast("B")))
+        self._empty    = memoryview(_np.zeros(shape, dtype=dtype)).cast("B")
+        self._thread   = _threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    @property
+    def dropped(self):
+        """the number of frames dropped (and replaced with empty frames) so far."""
+        return self._dropped
+
+    def write(self, frame):
+        """queues `frame` for writing, and returns whether it has been queued."""
+        if self._error is not None:
+            return False
+        # the empty frames in place of the dropped ones go first, one per free buffer
+        while self._pending > 0:
+            try:
+                slot = self._free.get_nowait()
+            except _queue.Empty:
+                break
+            self._filled.put((slot, self._empty))
+            self._pending -= 1
+        try:
+            if self._pending > 0:
+                raise _queue.Empty() # keep the order of the frames
+            slot = self._free.get_nowait()
+        except _queue.Empty:
+            self._dropped += 1
+            self._pending += 1
+            return False
+        buf, view = slot
+        # copyto() also rejects a frame of an unexpected shape
+        _np.copyto(buf, frame.transpose(self._axes))
+        self._filled.put((slot, view))
+        return True
+
+    def _next_batch(self):
+        """waits for the next (slot, view) item, and returns it together with the other items
+        queued by then (but not beyond the end-of-stream marker `None`)."""
+        batch = [self._filled.get()]
+        while (batch[-1] is not None) and (len(batch) < self.MAX_BATCH):
+            try:
+                batch.append(self._filled.get_nowait())
+            except _queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        running = True
+        while running:
+            batch = self._next_batch()
+            if batch[-1] is None:
+                batch.pop()
+                running = False
+            if self._abort:
+                break
+            try:
+                writev_fully(self._fd, [view for _, view in batch])
+            except OSError as e:
+                self._error = e
+                if (self._on_error is not None) and (not self._abort):
+                    self._on_error(e)
+                break
+            finally:
+                for slot, _ in batch:
+                    self._free.put(slot)
+
+    def close(self, timeout=None):
+        """writes the remaining frames, and stops the background thread.
+
+        returns whether the thread has stopped within `timeout`. otherwise, the remaining
+        frames are discarded, but the thread may still be blocked writing to `fd`:
+        the caller has to unblock it (e.g. by killing the reader), and then call join()."""
+        deadline = None if timeout is None else _time.monotonic() + timeout
+        while self._pending > 0:
+            try:
+                slot = self._free.get(timeout=self._remaining(deadline))
+            except _queue.Empty:
+                _LOGGER.warning(f"discarding {self._pending} empty frame(s) that could not be written in time")
+                break
+            self._filled.put((slot, self._empty))
+            self._pending -= 1
+        self._filled.put(None)
+        if self.join(self._remaining(deadline)):
+            return True
+        _LOGGER.warning("the encoder did not take the remaining frames in time: discarding them")
+        self._abort = True # let the thread stop after the current batch, without reporting errors
+        return False
+
+    def join(self, timeout=None):
+        """waits for the background thread to stop, and returns whether it has stopped."""
+        self._thread.join(timeout)
+        return not self._thread.is_alive()
+
+    @staticmethod
+    def _remaining(deadline):
+        if deadline is None:
+            return None
+        return max(deadline - _time.monotonic(), 0)
+
 ### the main storage service
 
-BASE_ENCODER_LIST = (
-    _encoding.RAW_VIDEO,
-    _encoding.MJPEG_CPU,
-    _encoding.MJPEG_QSV,
-    _encoding.H264_NVENC,
-)
+class EncoderProbe(_QtCore.QRunnable):
+    """tests the availability of the encoders on a QThreadPool,
+    and notifies the available ones through `signals.finished(tuple)`.
+    `fallback` is notified instead, in case the test fails unexpectedly."""
+
+    class Signals(_QtCore.QObject):
+        finished = _QtCore.pyqtSignal(tuple) # available Encoder objects
+
+    def __init__(self, encoders, fallback=()):
+        super().__init__()
+        self.setAutoDelete(False) # the Python side holds the reference
+        self._encoders = tuple(encoders)
+        self._fallback = tuple(fallback)
+        self.signals   = self.Signals()
+
+    def run(self):
+        try:
+            available = _encoding.available_encoders(self._encoders)
+        except Exception as e:
+            # `finished` must be emitted anyway, as StorageService waits for it
+            _LOGGER.error(f"failed to test the availability of the encoders: {e}")
+            _print_exc()
+            available = self._fallback
+        self.signals.finished.emit(available)
 
 class StorageService(_QtCore.QObject):
-    EXPERIMENT_ATTRIBUTES = ("subject", "datestr", "indexstr", "domain", "appendagestr")
+    # (format field, Experiment attribute)
+    EXPERIMENT_FIELDS     = (("subject",   "subject"),
+                             ("date",      "datestr"),
+                             ("index",     "indexstr"),
+                             ("domain",    "domain"),
+                             ("appendage", "appendagestr"))
     TIMESTAMP_FORMAT      = "%H%M%S"
     DEFAULT_NAME_PATTERN  = "{subject}_{date}_{domain}_{time}{appendage}"
     QUALITY_RANGE         = (1, 100)
+    WRITE_BUFFERS         = 8 # the number of frames that can wait for the encoder
     DEFAULT_TIMEOUT       = 3.0
 
-    DEFAULT_ENCODERS = tuple(enc for enc in BASE_ENCODER_LIST if enc.check_availability())
+    # the encoders to be listed until EncoderProbe finishes
+    INITIAL_ENCODERS = tuple(enc for enc in _encoding.BASE_ENCODER_LIST \
+                             if enc.device in (_encoding.Devices.NONE, _encoding.Devices.CPU))
 
     _singleton = None
 
     updatedEncoder       = _QtCore.pyqtSignal(object) # an Encoder object
+    updatedEncoderList   = _QtCore.pyqtSignal(tuple)  # Encoder objects
     updatedQuality       = _QtCore.pyqtSignal(int)
     updatedDirectory     = _QtCore.pyqtSignal(str)
     updatedPattern       = _QtCore.pyqtSignal(str)
@@ -75,19 +291,34 @@ class StorageService(_QtCore.QObject):
 
     def __init__(self, parent=None):
         super().__init__(parent=parent)
-        self._encoder    = self.DEFAULT_ENCODERS[0]
+        self._encoders   = self.INITIAL_ENCODERS
+        self._encoder    = self._encoders[0]
+        self._requested  = None # the encoder description waiting for EncoderProbe to finish
+        self._stalled    = [] # (FrameWriter, pipe) of the writer threads that could not be stopped
         self._quality    = 75
-        self._directory  = str(_Path().resolve())
+        self._dirpath    = _Path().resolve()
+        self._directory  = str(self._dirpath)
         self._pattern    = self.DEFAULT_NAME_PATTERN
+        self._format     = self.as_format(self._pattern)
 
         self._experiment = _Experiment.instance() # must be non-None
+        self._fields     = None # the cached format fields except for 'time'
+        self._filename   = None # the file name last notified through updatedFileName
+        self._experiment.updated.connect(self.invalidateFormatFields) # must come before updateFileName
         self._experiment.updated.connect(self.updateFileName)
 
         self._proc       = None # the placeholder for the encoder process
         self._sink       = None # the STDIN of the encoder process
-        self._nextindex  = None # the frame index being expected by the encoder (for detection of skips)
-        self._empty      = None # the empty frame to be inserted in case of skips
-        self._convert    = None # the function to make the frame into the proper structure
+        self._sink_fd    = None # the file descriptor of `_sink`
+        self._logging    = None # the thread that forwards the STDERR of the encoder process
+        self._axes       = None # the axes to transpose the frame into the proper structure
+        self._writer     = None # the FrameWriter that passes the frames to the encoder
+
+        # the availability of the encoders may take seconds to be tested
+        self._probing    = True
+        self._probe      = EncoderProbe(_encoding.BASE_ENCODER_LIST, fallback=self.INITIAL_ENCODERS)
+        self._probe.signals.finished.connect(self.updateWithAvailableEncoders)
+        _QtCore.QThreadPool.globalInstance().start(self._probe)
 
     def as_dict(self):
         out = {}
@@ -113,12 +344,43 @@ class StorageService(_QtCore.QObject):
                     value = encoder
                     break
             if isinstance(value, str):
+                if self._probing == True:
+                    _LOGGER.debug(f"encoder '{value}' will be set after the availability test")
+                    self._requested = value
+                    return
                 raise ValueError(f"encoder not found: '{value}'")
         self._encoder = value
+        self._fields  = None # the suffix may have changed
         self.updatedEncoder.emit(self._encoder)
         self.message.emit("info", f"video encoder: {self._encoder.description}")
         self.updateFileName()
 
+    def updateWithAvailableEncoders(self, encoders):
+        self._probing = False
+        if len(encoders) == 0:
+            self.message.emit("warning", "No video encoder available: make sure that 'ffmpeg' is installed.")
+            return
+        self._encoders = encoders
+        self.updatedEncoderList.emit(self._encoders)
+        if self.is_running():
+            # the encoder must not be switched during recording: wait for close()
+            _LOGGER.debug("the encoder will be updated after the recording")
+            return
+        self._applyRequestedEncoder()
+
+    def _applyRequestedEncoder(self):
+        """sets the encoder requested during the availability test, or
+        the first available one if the current encoder is not available."""
+        requested, self._requested = self._requested, None
+        if requested is not None:
+            try:
+                self.setEncoder(requested)
+                return
+            except ValueError as e:
+                self.message.emit("warning", f"Encoder not available: {e}")
+        if self._encoder not in self._encoders:
+            self.setEncoder(self._encoders[0])
+
     def getQuality(self):
         return self._quality
 
@@ -138,39 +400,61 @@ class StorageService(_QtCore.QObject):
         return self._directory
 
     def setDirectory(self, value):
-        self._directory = str(_Path(value).resolve())
+        self._dirpath   = _Path(value).resolve()
+        self._directory = str(self._dirpath)
         self.updatedDirectory.emit(self._directory)
         self.message.emit("info", f"save directory: {self._directory}")
 
     def openDirectory(self):
-        """opens the directory on Explorer"""
-        proc = _sp.run(["start", self._directory], shell=True)
-        if proc.returncode != 0:
+        """opens the directory on the file manager of the platform"""
+        try:
+            if _sys.platform == "win32":
+                _os.startfile(self._directory)
+                return
+            elif _sys.platform == "darwin":
+                proc = _sp.run(["open", self._directory], check=False)
+            else:
+                proc = _sp.run(["xdg-open", self._directory], check=False)
+        except OSError as e:
             # TODO: generate warning
-            _LOGGER.warning("failed to open: " + self._directory)
+            _LOGGER.warning(f"failed to open: {self._directory} ({e})")
+            return
+        if proc.returncode != 0:
+            _LOGGER.warning(f"failed to open: {self._directory} (exit code {proc.returncode})")
 
     def getPattern(self):
         return self._pattern
 
     def setPattern(self, value):
         self._pattern = str(value)
+        self._format  = self.as_format(self._pattern)
         self.updatedPattern.emit(self._pattern)
         self.message.emit("info", f"file-name pattern: {self._pattern}")
         self.updateFileName()
 
-    def updateFileName(self):
-        pattern = self._pattern
+    def invalidateFormatFields(self):
+        """discards the cached fields of format_dict, so that they are rebuilt next time."""
+        self._fields = None
+
+    @staticmethod
+    def as_format(pattern):
+        """returns the format string corresponding to the file-name pattern."""
         if "{suffix}" not in pattern:
             pattern = pattern + "{suffix}"
-        filename = pattern.format(**(self.format_dict))
-        self.updatedFileName.emit(filename)
+        return pattern
+
+    def updateFileName(self):
+        filename = self._format.format_map(self.format_dict)
+        if filename != self._filename:
+            self._filename = filename
+            self.updatedFileName.emit(filename)
         return filename
 
     def as_path(self, filename):
-        return _Path(self._directory) / filename
+        return self._dirpath / filename
 
     def list_encoders(self):
-        return self.DEFAULT_ENCODERS
+        return self._encoders
 
     def prepare(self,
                 framerate=30,
@@ -183,40 +467,84 @@ class StorageService(_QtCore.QObject):
                                        rotation=rotation,
                                        quality=self._quality)
         self._proc, self._sink = options.open_stream()
+        self._sink_fd = self._sink.fileno()
+        enlarge_pipe(self._sink_fd)
+        self._logging = _threading.Thread(target=log_encoder_output,
+                                          args=(self._proc.stderr,),
+                                          daemon=True)
+        self._logging.start()
         if descriptor.ndim == 3:
-            self._convert = lambda frame: frame.transpose((1,0,2))
+            self._axes = (1,0,2)
         else:
-            self._convert = lambda frame: frame.T
+            self._axes = (1,0)
+        shape         = tuple(rotation.transform_shape(descriptor.shape))
+        self._writer  = FrameWriter(self._sink_fd,
+                                    shape=(shape[1], shape[0]) + shape[2:],
+                                    dtype=descriptor.dtype,
+                                    axes=self._axes,
+                                    capacity=self.WRITE_BUFFERS,
+                                    on_error=self._fireWriteError)
 
     def write(self, frame):
         # frames can be assumed to be non-None
         # the frame must have been rotated before coming here
-        self._sink.write(self._convert(frame).tobytes())
+        if (not self._writer.write(frame)) and (self._writer.dropped == 1):
+            _LOGGER.warning("the encoder does not keep up with the acquisition: dropping frames")
+
+    def _fireWriteError(self, e):
+        # called from the thread of FrameWriter
+        _LOGGER.error(f"failed to pass frames to the encoder: {e}")
+        self.interruptAcquisition.emit(f"Encoding error: {e}")
 
     def close(self):
         if self._sink is not None:
+            proc    = self._proc
+            stopped = self._writer.close(timeout=self.DEFAULT_TIMEOUT)
+            if not stopped:
+                # the encoder stopped reading: killing it makes the blocked write fail (EPIPE)
+                _LOGGER.error("the encoder does not take frames any more: killing the encoder process")
+                proc.kill()
+                stopped = self._writer.join(timeout=self.DEFAULT_TIMEOUT)
+            if self._writer.dropped > 0:
+                self.message.emit("warning", f"Frames dropped: {self._writer.dropped} frame(s) could not be passed to the encoder in time, and were replaced with empty frames.")
+
             # close the pipe
-            proc = self._proc
-            self._terminate_safely(proc)
+            if stopped:
+                self._terminate_safely(proc)
+            else:
+                # the descriptor must not be closed (and reused) under the writer thread:
+                # keep the references to the pipe, so that it is not closed by the GC either
+                _LOGGER.error("the writer thread does not stop: leaving the pipe to the encoder open")
+                self._stalled.append((self._writer, self._sink))
+                proc.wait()
+            self._writer = None
+            self._logging.join(timeout=self.DEFAULT_TIMEOUT)
+            self._logging = None
 
             self._proc = None
             del proc
             sink = self._sink
             self._sink = None
+            self._sink_fd = None
             del sink
 
+            if not self._probing:
+                # the encoder list may have been updated during recording
+                self._applyRequestedEncoder()
+
     def _terminate_safely(self, proc):
-        """'safely' terminate the given process"""
+        """'safely' terminate the given process.
+        closing STDIN signals EOF to ffmpeg, which then finalizes the output file."""
         try:
-            stdout, stderr = proc.communicate(timeout=self.DEFAULT_TIMEOUT)
-        except TimeoutExpired:
+            proc.stdin.close()
+        except OSError as e:
+            _LOGGER.warning(f"failed to close the pipe to the encoder: {e}")
+        try:
+            proc.wait(timeout=self.DEFAULT_TIMEOUT)
+        except _sp.TimeoutExpired:
             _LOGGER.error("The encoder process did not seem to finish within the expected time window")
             proc.kill()
-            stdout, stderr = proc.communicate()
-        if stdout is not None:
-            print(stdout.decode('utf-8'), file=_sys.stdout, flush=True)
-        if stderr is not None:
-            print(stderr.decode('utf-8'), file=_sys.stderr, flush=True)
+            proc.wait()
 
     def is_running(self):
         """returns whether the storage service is currently running the encoder process."""
@@ -228,12 +556,13 @@ class StorageService(_QtCore.QObject):
 
     @property
     def format_dict(self):
-        opts = dict((attrname, getattr(self._experiment, attrname))\
-                    for attrname in self.EXPERIMENT_ATTRIBUTES)
-        for name in ("date", "index", "appendage"):
-            opts[name] = opts.pop(name + "str")
-        opts["time"]   = _datetime.now().strftime(self.TIMESTAMP_FORMAT)
-        opts["suffix"] = self.suffix
+        if self._fields is None:
+            fields = dict((name, getattr(self._experiment, attrname)) \
+                        for name, attrname in self.EXPERIMENT_FIELDS)
+            fields["suffix"] = self.suffix
+            self._fields = fields
+        opts = dict(self._fields)
+        opts["time"] = _datetime.now().strftime(self.TIMESTAMP_FORMAT)
         return opts
 
     encoder   = property(fget=getEncoder,   fset=setEncoder)
@@ -241,5 +570,3 @@ class StorageService(_QtCore.QObject):
     directory = property(fget=getDirectory, fset=setDirectory)
     pattern   = property(fget=getPattern,   fset=setPattern)
     filename  = property(fget=updateFileName)
-
-from .experiment import Experiment as _Experiment
@@ -22,6 +22,7 @@
 
 import re as _re
 from collections import namedtuple as _namedtuple
+from functools import lru_cache as _lru_cache
 
 from pyqtgraph.Qt import QtCore as _QtCore, \
                          QtGui as _QtGui, \
@@ -64,18 +65,20 @@ class StrobeModes:
 
     @staticmethod
     def requires_strobe(strobemode, acqmode):
-        if acqmode == AcquisitionModes.FOCUS:
-            return strobemode == StrobeModes.FOCUS_AND_GRAB
-        elif acqmode == AcquisitionModes.GRAB:
-            return strobemode in (StrobeModes.FOCUS_AND_GRAB, StrobeModes.GRAB_ONLY)
-        else:
-            return False
+        return (acqmode, strobemode) in _STROBE_REQUIRED
 
 class AcquisitionModes:
     FOCUS   = "FOCUS" # start FOCUS mode
     GRAB    = "GRAB"  # start GRAB mode
     IDLE    = "ABORT" # stop the current acquisition
 
+# the (acquisition mode, strobe mode) combinations in which the strobe is turned on
+_STROBE_REQUIRED = frozenset((
+    (AcquisitionModes.FOCUS, StrobeModes.FOCUS_AND_GRAB),
+    (AcquisitionModes.GRAB,  StrobeModes.FOCUS_AND_GRAB),
+    (AcquisitionModes.GRAB,  StrobeModes.GRAB_ONLY),
+))
+
 def transpose_image(img):
     if img.ndim == 3:
         return img.transpose((1,0,2))
@@ -128,14 +131,25 @@ class FrameRotation:
         return FrameRotation.OPTIONS[key]
 
 class FrameFormat(_namedtuple("_FrameFormat", ("pixel", "width", "height"))):
+    __slots__ = ()
     FORMAT_PATTERN = _re.compile(r"([a-zA-Z0-9-]+) \((\d+)x(\d+)\)")
 
     @classmethod
+    @_lru_cache(maxsize=32)
     def from_name(cls, format_name):
+        """parses `format_name` e.g. 'Y800 (640x480)'.
+        the result is cached, as the device offers only a handful of formats."""
+        pixel, _, size   = format_name.partition(" (")
+        size, closed, _  = size.partition(")")
+        width, _, height = size.partition("x")
+        if closed and size.isascii() and pixel.isascii() and pixel.replace("-", "").isalnum() \
+                and width.isdecimal() and height.isdecimal():
+            return cls(pixel, int(width), int(height))
+        # fall back to the pattern for anything unusual
         matched = cls.FORMAT_PATTERN.match(format_name)
         if not matched:
             raise RuntimeError(f"unexpected format name: {format_name}")
-        pixel, width, height = [matched.group(i) for i in (1, 2, 3)]
+        pixel, width, height = matched.groups()
         return cls(pixel, int(width), int(height))
 
     @property
@@ -240,6 +254,19 @@ class ViewGroup(_QtWidgets.QGroupBox, SessionControl):
         self._layout.addWidget(item.label,  row,  col, alignment=_QtCore.Qt.AlignRight)
         self._layout.addWidget(item.widget, row, col+1, 1, widget_colspan)
 
+    def _addFormItems(self, items, row=0, col=0):
+        """adds `items` to the consecutive rows starting from `row`,
+        with the updates of the view suspended until all of them are added."""
+        add   = self._layout.addWidget
+        right = _QtCore.Qt.AlignRight
+        self.setUpdatesEnabled(False)
+        try:
+            for offset, item in enumerate(items):
+                add(item.label,  row + offset, col, alignment=right)
+                add(item.widget, row + offset, col+1)
+        finally:
+            self.setUpdatesEnabled(True)
+
     def _addWidget(self, widget, row, col, rowspan=1, colspan=1, alignment=_QtCore.Qt.AlignLeft):
         self._layout.addWidget(widget, row, col, rowspan, colspan, alignment=alignment)
 
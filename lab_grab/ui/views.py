@@ -42,7 +42,7 @@ class FrameView(_QtWidgets.QGraphicsView, _utils.SessionControl):
         super().__init__(parent=parent)
         self.initWithSession(session)
         self._scene   = _QtWidgets.QGraphicsScene()
-        self._image   = _pg.ImageItem()
+        self._image   = _pg.ImageItem(autoDownsample=True) # reduce the frame to the screen resolution before level mapping
         self._scene.addItem(self._image)
         self._scene.setSceneRect(_QtCore.QRectF(0, 0, *self.INITIAL_DIMS))
         self.setScene(self._scene)
@@ -326,10 +326,9 @@ class FrameFormatSettings(_utils.ViewGroup):
         self._rotation = _utils.FormItem("Rotation clockwise", _QtWidgets.QComboBox())
         for item in self.session.acquisition.rotation.options:
             self._rotation.widget.addItem(item)
-        for row, obj in enumerate((self._format,
-                                   self._x,
-                                   self._y,)):
-            self._addFormItem(obj, row, 0)
+        self._addFormItems((self._format,
+                            self._x,
+                            self._y,))
         self._layout.addWidget(self._center, 3, 1)
         self._addFormItem(self._rotation, 4, 0)
 
@@ -462,9 +461,9 @@ class AcquisitionSettings(_utils.ViewGroup):
         self._layout.addWidget(self._autoexp, 2, 2)
         self._addFormItem(self._gain, 3, 0)
         self._layout.addWidget(self._autogain, 3, 2)
-        self._addFormItem(self._gamma, 4, 0)
-        self._addFormItem(self._binning, 5, 0)
-        self._addFormItem(self._strobe, 6, 0)
+        self._addFormItems((self._gamma,
+                            self._binning,
+                            self._strobe,), row=4)
 
         self.setEnabled(False)
 
@@ -696,15 +695,13 @@ class StorageSettings(_utils.ViewGroup):
         self.session.storage.updatedQuality.connect(self._quality.widget.setValue)
         self._quality.widget.valueChanged.connect(self.session.storage.setQuality)
         self._quality.setEnabled(self.session.storage.has_quality_setting())
-        for encoder in self.session.storage.list_encoders():
-            self._encoder.widget.addItem(encoder.description)
-        self._encoder.widget.setCurrentText(self.session.storage.encoder.description)
+        self.updateWithEncoderList(self.session.storage.list_encoders())
         self._encoder.widget.currentTextChanged.connect(self.dispatchEncoderUpdate)
-        self._addFormItem(self._encoder,   0, 0)
-        self._addFormItem(self._quality,   1, 0)
-        self._addFormItem(self._directory, 2, 0)
-        self._addFormItem(self._pattern,   3, 0)
-        self._addFormItem(self._file,      4, 0)
+        self._addFormItems((self._encoder,
+                            self._quality,
+                            self._directory,
+                            self._pattern,
+                            self._file,))
 
         self.setEnabled(True)
 
@@ -716,6 +713,7 @@ class StorageSettings(_utils.ViewGroup):
         session.storage.updatedPattern.connect(self.updateWithPattern)
         session.storage.updatedFileName.connect(self.updateWithFileName)
         session.storage.updatedEncoder.connect(self.updateWithEncoder)
+        session.storage.updatedEncoderList.connect(self.updateWithEncoderList)
 
         self.requestedEncoderUpdate.connect(session.storage.setEncoder)
         self.requestedDirectoryUpdate.connect(session.storage.setDirectory)
@@ -746,6 +744,16 @@ class StorageSettings(_utils.ViewGroup):
         self._quality.setEnabled(self.session.storage.has_quality_setting())
         self._updating = False
 
+    def updateWithEncoderList(self, encoders):
+        if not hasattr(self, "_encoder"):
+            return # during initialization
+        self._updating = True
+        self._encoder.widget.clear()
+        for encoder in encoders:
+            self._encoder.widget.addItem(encoder.description)
+        self._encoder.widget.setCurrentText(self.session.storage.encoder.description)
+        self._updating = False
+
     def updateWithDirectory(self, value):
         self._updating = True
         self._directory.widget.value = value
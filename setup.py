@@ -40,9 +40,6 @@ setuptools.setup(
         'Programming Language :: Python :: 3',
         ],
     packages=setuptools.find_packages(),
-    package_data={
-        'lab_grab': ["enctest/*.jpg"],
-    },
     entry_points={
         'console_scripts': [ 'lab-grab=lab_grab:parse_commandline', ],
     }